@@ -5,127 +5,424 @@
 
 import argparse
 import datetime
+import functools
+import idna
 import logging
 import os
 import pathlib
 import requests
+import socket
+import sys
+import tempfile
+import threading
+import time
 
 import nagiosplugin
 import requests_cache
+import urllib3
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from urllib.parse import quote, urljoin, urlsplit
+from urllib3.util import Retry
+
+# only the events and entities of the RDAP JSON are needed, stream them
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+# faster decoding of the RDAP and IANA JSON when available
+try:
+    import orjson as _json
+except ImportError:
+    import json as _json
 
 __script__ = os.path.basename(__file__)
 __version__ = '0.1'
 
 _log = logging.getLogger('nagiosplugin')
 
-# cache session for json and csv storage
-uid = os.getuid()
-home = pathlib.Path.home()
-for possible_dir in [f'/run/{uid}', home, '/tmp']:
-    iana_rdap_cache = f'{possible_dir}/iana_rdap_cache'
-    try:
-        cache = open(f'{iana_rdap_cache}.sqlite', 'a')
-        cache.close()
-        session = requests_cache.CachedSession(iana_rdap_cache, cache_control=True)
-        _log.debug(f'Caching to {iana_rdap_cache}.sqlite')
-        break
-    except IOError:
-        _log.debug(f'{iana_rdap_cache}.sqlite is not writtable')
-        session = requests
-        iana_rdap_cache = ''
+# longest Retry-After we accept to wait for, the server is given up beyond
+retry_after_max = 5
+
+class BoundedRetry(Retry):
+    """Retry giving up instead of sleeping more than retry_after_max seconds."""
+
+    def increment(self, method=None, url=None, response=None, error=None,
+                  _pool=None, _stacktrace=None):
+        if response is not None and self.respect_retry_after_header:
+            retry_after = self.get_retry_after(response)
+            if retry_after is not None and retry_after > retry_after_max:
+                raise urllib3.exceptions.MaxRetryError(
+                    _pool, url,
+                    urllib3.exceptions.ResponseError(
+                        f'the server asked to wait {retry_after:g}s'
+                    )
+                )
+        return super().increment(
+            method, url, response, error, _pool, _stacktrace
+        )
 
-def find_rdap_server(domain):
-    """Find the TLD rdap server."""
-    import pandas
+# transient errors are retried with backoff, honouring a short Retry-After.
+# This bounds each query, not the whole check: a query makes at most 3
+# attempts of 5s connect + 10s without data read, plus 2 waits of at most 5s.
+# The read timeout is per read, so a server trickling data can last longer,
+# and a check may chain up to 4 queries (dns.json, TLD RDAP, registrar csv,
+# registrar RDAP). The IANA ones are usually answered from the caches; the
+# Nagios service check timeout (60s by default) is the overall deadline
+_retries = BoundedRetry(
+    total=2,
+    backoff_factor=0.5,
+    status_forcelist=(429, 500, 502, 503, 504),
+    allowed_methods=frozenset(['GET']),
+    respect_retry_after_header=True
+)
+_timeout = (5, 10)
+
+# the RDAP queries go straight through urllib3, without the requests machinery
+_rdap_pool = urllib3.PoolManager(num_pools=4, maxsize=8, retries=_retries)
+_rdap_timeout = urllib3.Timeout(connect=_timeout[0], read=_timeout[1])
+
+# pooled connections for the IANA fetches
+_iana_adapter = HTTPAdapter(
+    pool_connections=16,
+    pool_maxsize=32,
+    max_retries=_retries
+)
+_iana_session = requests.Session()
+_iana_session.mount('https://', _iana_adapter)
+
+# resolve each host once per dns_ttl seconds, batch runs hit the same
+# servers but --stdin must still follow their address changes
+dns_ttl = 300
+dns_cache_size = 128
+_getaddrinfo = socket.getaddrinfo
+_dns_cache = {}
+_dns_cache_lock = threading.Lock()
+
+def cached_getaddrinfo(*args, **kwargs):
+    """socket.getaddrinfo memoised for dns_ttl seconds, failures are not cached."""
+    key = (args, tuple(sorted(kwargs.items())))
+    with _dns_cache_lock:
+        entry = _dns_cache.get(key)
+    if entry is not None and time.monotonic() - entry[0] < dns_ttl:
+        return list(entry[1])
+
+    addresses = _getaddrinfo(*args, **kwargs)
+    with _dns_cache_lock:
+        _dns_cache.pop(key, None)
+        # forget the oldest resolution when full
+        if len(_dns_cache) >= dns_cache_size:
+            del _dns_cache[next(iter(_dns_cache))]
+        _dns_cache[key] = (time.monotonic(), addresses)
+    return list(addresses)
+
+socket.getaddrinfo = cached_getaddrinfo
+
+# cap the concurrent queries per RDAP host in batch mode
+max_workers = 8
+max_per_host = 4
+_host_slots = {}
+_host_slots_lock = threading.Lock()
+
+# processed TLD map, kept next to the sqlite cache
+tld_map_max_age = 24 * 3600
+# the IANA maps are kept in memory for an hour, the freshness of their
+# source is then checked again (TLD map file age, HTTP cache control)
+iana_map_max_age = 3600
+# a failed IANA fetch is tried again after a minute
+failure_max_age = 60
+
+# the caches are set up on first use, not at import, so that --help stays
+# instant and the failures surface while checking
+
+def cached_once(max_age=None):
+    """Memoise a function without arguments, computing it in one thread only.
+
+    functools.lru_cache does not serialise the first call, so that the worker
+    threads of a batch would all fetch and write the same data. A failure is
+    memoised too: the threads waiting for it get the same error instead of
+    each trying the failing fetch again.
+
+    With --stdin the process lives for days, so a value is computed again
+    once older than max_age seconds, and a failure after failure_max_age.
+    """
+    def decorator(func):
+        lock = threading.Lock()
+        outcome = []
+
+        @functools.wraps(func)
+        def wrapper():
+            with lock:
+                if outcome:
+                    stamp, value, error = outcome[0]
+                    age = time.monotonic() - stamp
+                    if error is not None:
+                        expired = age >= failure_max_age
+                    else:
+                        expired = max_age is not None and age >= max_age
+                    if expired:
+                        outcome.clear()
+                if not outcome:
+                    try:
+                        outcome.append((time.monotonic(), func(), None))
+                    except Exception as err:
+                        outcome.append((time.monotonic(), None, err))
+                stamp, value, error = outcome[0]
+            if error is not None:
+                raise error
+            return value
+
+        return wrapper
+
+    return decorator
+
+@cached_once()
+def cache_dir():
+    """Find a writtable directory for the IANA caches, None if there is none."""
+    uid = os.getuid()
+    home = pathlib.Path.home()
+    for possible_dir in [f'/run/{uid}', home, '/tmp']:
+        iana_rdap_cache = f'{possible_dir}/iana_rdap_cache'
+        try:
+            cache = open(f'{iana_rdap_cache}.sqlite', 'a')
+            cache.close()
+            return possible_dir
+        except IOError:
+            _log.debug('%s.sqlite is not writtable', iana_rdap_cache)
+
+    return None
 
-    list2dict = []
-    req = session.get('https://data.iana.org/rdap/dns.json', timeout=120)
-    for k,v in req.json()['services']:
-        for x in k:
-            list2dict.append({'name':x, 'url':v[0]})
+@cached_once()
+def iana_session():
+    """Get the session for json and csv fetches, cached on disk if possible."""
+    possible_dir = cache_dir()
+    if possible_dir is None:
+        return _iana_session
+
+    iana_rdap_cache = f'{possible_dir}/iana_rdap_cache'
+    session = requests_cache.CachedSession(iana_rdap_cache, cache_control=True)
+    session.mount('https://', _iana_adapter)
+    _log.debug('Caching to %s.sqlite', iana_rdap_cache)
+    return session
+
+@cached_once(max_age=iana_map_max_age)
+def load_tld_map():
+    """Get the TLD to RDAP server map, from disk if it is fresh enough."""
+    if cache_dir() is None:
+        tld_map_cache = ''
+    else:
+        tld_map_cache = f'{cache_dir()}/iana_tld_map.json'
 
-    df = pandas.DataFrame(list2dict)
+    if tld_map_cache:
+        try:
+            stat = os.stat(tld_map_cache)
+            # the file may be in /tmp, do not trust one planted by someone else
+            if (stat.st_uid == os.getuid()
+                    and time.time() - stat.st_mtime < tld_map_max_age):
+                with open(tld_map_cache, 'rb') as f:
+                    tld_map = _json.loads(f.read())
+                if isinstance(tld_map, dict):
+                    _log.debug('Using the TLD map from %s', tld_map_cache)
+                    return tld_map
+        except (OSError, ValueError):
+            pass
+        _log.debug('%s is not usable, fetching the IANA JSON', tld_map_cache)
+
+    req = iana_session().get('https://data.iana.org/rdap/dns.json', timeout=_timeout)
+    services = _json.loads(req.content)['services']
+    tld_map = {x: v[0] for k, v in services for x in k}
+
+    if tld_map_cache:
+        # orjson dumps to bytes, json to str
+        data = _json.dumps(tld_map)
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        # write then rename so that a concurrent run never reads half a file,
+        # mkstemp creates a new file (no planted symlink followed) in 0600
+        tmp = None
+        try:
+            fd, tmp = tempfile.mkstemp(dir=cache_dir(), prefix='iana_tld_map.')
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp, tld_map_cache)
+        except OSError:
+            _log.debug('%s is not writtable', tld_map_cache)
+            if tmp is not None:
+                try:
+                    os.unlink(tmp)
+                except OSError:
+                    pass
+
+    return tld_map
 
+def find_rdap_server(domain):
+    """Find the TLD rdap server."""
     tld = domain.split('.')[-1]
-    try:
-        url = df[df.name == (tld)].iloc[0].url
+    url = load_tld_map().get(tld)
     # no rdap on tld
-    except IndexError:
+    if url is None:
         raise nagiosplugin.CheckError(
             f'The TLD {tld} does not have an RDAP server, try forcing the registrar server with --server. It can be found on https://www.iana.org/assignments/registrar-ids/registrar-ids.xhtml'
         )
 
-    _log.debug(f'The used RDAP server is {url}')
+    _log.debug('The used RDAP server is %s', url)
 
     return url
 
 
-def parse_ldap(domain, rdap_server):
-    req_rdap = requests.get(f'{rdap_server}domain/{domain}')
+def host_slot(url):
+    """Get the semaphore limiting the concurrent queries to the url host."""
+    host = urlsplit(url).netloc
+    with _host_slots_lock:
+        if host not in _host_slots:
+            _host_slots[host] = threading.BoundedSemaphore(max_per_host)
+        return _host_slots[host]
 
-    match req_rdap.status_code:
-        case 400:
-            raise nagiosplugin.CheckError(
-                f'Got {req_rdap.status_code}, the RDAP server {rdap_server} interprets this domain query as a bad request'
-            )
-        case 403:
-            raise nagiosplugin.CheckError(
-                f'Got {req_rdap.status_code}, the RDAP server {rdap_server} refused to reply'
-            )
-        case 404:
-            raise nagiosplugin.CheckError(
-                f'Got {req_rdap.status_code}, the domain {domain} has not been found'
-            )
-        case 409:
-            raise nagiosplugin.CheckError(
-                f'Got {req_rdap.status_code}, the RDAP server {rdap_server} has too many requests'
-            )
-        case 503:
-            raise nagiosplugin.CheckError(
-                f'Got {req_rdap.status_code}, the RDAP server {rdap_server} seems broken'
-            )
-        case _:
-            pass
 
-    _log.debug(f'The used RDAP JSON from {req_rdap.url} is {req_rdap.json()}')
+def rdap_members(req_rdap):
+    """Yield the (member, item) pairs of the RDAP events and entities lists.
+
+    With ijson the items are built while the response is read, so that the
+    caller can stop early; without it the whole response is decoded first.
+    """
+    if ijson is None:
+        payload = _json.loads(req_rdap.data)
+        for member in ('events', 'entities'):
+            for item in payload.get(member, ()):
+                yield member, item
+        return
+
+    builder = None
+    for prefix, event, value in ijson.parse(req_rdap):
+        if builder is None:
+            if prefix in ('events.item', 'entities.item') and event == 'start_map':
+                builder = ijson.ObjectBuilder()
+                builder.event(event, value)
+            continue
+
+        builder.event(event, value)
+        if prefix in ('events.item', 'entities.item') and event == 'end_map':
+            yield prefix.split('.')[0], builder.value
+            builder = None
 
-    raw_expiration = [
-        event.get('eventDate', False)
-        for event in req_rdap.json().get('events', {})
-        if event.get('eventAction', {}) == 'expiration'
-        or event.get('eventAction', {}) == 'registrar expiration'
-    ]
+
+def parse_ldap(domain, rdap_server):
+    # escape / too, urljoin would resolve ../ segments otherwise
+    url = urljoin(rdap_server, 'domain/' + quote(domain, safe=''))
+    # the slot is held until the reply has been read
+    with host_slot(rdap_server):
+        req_rdap = _rdap_pool.request(
+            'GET', url, timeout=_rdap_timeout, preload_content=False
+        )
+        stopped_early = False
+        try:
+            match req_rdap.status:
+                case 400:
+                    raise nagiosplugin.CheckError(
+                        f'Got {req_rdap.status}, the RDAP server {rdap_server} interprets this domain query as a bad request'
+                    )
+                case 403:
+                    raise nagiosplugin.CheckError(
+                        f'Got {req_rdap.status}, the RDAP server {rdap_server} refused to reply'
+                    )
+                case 404:
+                    raise nagiosplugin.CheckError(
+                        f'Got {req_rdap.status}, the domain {domain} has not been found'
+                    )
+                # 429 and 5xx are retried by the pool manager
+                case _ if not 200 <= req_rdap.status < 300:
+                    raise nagiosplugin.CheckError(
+                        f'Got {req_rdap.status}, the RDAP server {rdap_server} did not reply properly'
+                    )
+                case _:
+                    pass
+
+            # stop reading at the first expiration event
+            expiration_date = None
+            entities = []
+            for member, item in rdap_members(req_rdap):
+                _log.debug('The used RDAP JSON from %s has in %s: %s', url, member, item)
+                if member == 'entities':
+                    entities.append(item)
+                elif item.get('eventAction') in ('expiration', 'registrar expiration'):
+                    expiration_date = item.get('eventDate', False)
+                    # without ijson the whole reply has already been read
+                    stopped_early = ijson is not None
+                    break
+        finally:
+            # a half read connection can not be reused, drop it rather than
+            # reading the rest of the reply
+            if stopped_early:
+                req_rdap.close()
+            else:
+                req_rdap.drain_conn()
+            req_rdap.release_conn()
+
+    raw_expiration = []
 
     # if we have not found the field expiration in the list eventAction
-    if len(raw_expiration) == 0:
-        _log.debug(f'The domain JSON for {domain} does not have "eventAction"."expiration" field, run with -vvv or --debug to have the JSON dump')
+    if expiration_date is None:
+        _log.debug('The domain JSON for %s does not have "eventAction"."expiration" field, run with -vvv or --debug to have the JSON dump', domain)
         raw_registrar = [
             entity.get('vcardArray', False)
-            for entity in req_rdap.json().get('entities', {})
+            for entity in entities
             if 'registrar' in entity.get('roles')
         ]
 
-        # I hope that order of the fields is consistent
-        # and I do not know at all what fn means
+        # the vCard property name is the first item of each line, fn is the
+        # formatted name, its value is the fourth item
         # We try to find the registrar here
-        for line in raw_registrar[0][1]:
-            if 'fn' in line:
-                raw_expiration.append(line[3])
+        fn_entry = next(
+            (line for line in raw_registrar[0][1] if line and line[0] == 'fn'),
+            None
+        )
+        if fn_entry is None:
+            raise nagiosplugin.CheckError(
+                f'The domain JSON for {domain} has neither expiration date nor registrar name'
+            )
+        raw_expiration.append(fn_entry[3])
 
-    elif len(raw_expiration) == 1:
-        fecha = raw_expiration[0].split('T')[0].strip().split()
+    elif isinstance(expiration_date, str):
+        fecha = expiration_date.split('T')[0].strip().split()
         fecha = fecha[0]
-        today = datetime.datetime.now()
-        delta = datetime.datetime.strptime(fecha, '%Y-%m-%d') - today
-        raw_expiration[0] = delta.days
+        today = datetime.date.today()
+        delta = datetime.date.fromisoformat(fecha) - today
+        raw_expiration.append(delta.days)
 
     else:
         raise nagiosplugin.CheckError(
-            f'{raw_expiration} is too long'
+            f'{expiration_date} is not a valid expiration date'
         )
 
     return raw_expiration
 
+iana_registrars_url = 'https://www.iana.org/assignments/registrar-ids/registrar-ids-1.csv'
+
+@cached_once(max_age=iana_map_max_age)
+def load_registrar_map():
+    """Get the registrar name to RDAP server map from the IANA CSV."""
+    import csv
+
+    # the csv is cached on disk by the session, the parsed map in memory
+    iana_registrars_req = iana_session().get(iana_registrars_url, timeout=_timeout)
+    iana_registrars_csv = iana_registrars_req.content.decode('utf-8')
+    # lower case comparaison just in case (haha)
+    # skip the short rows and the registrars without RDAP server, and be sure
+    # that the url ends with / for the domain query urljoin
+    registrars = {}
+    for registrar_row in csv.reader(
+        iana_registrars_csv.splitlines(),
+        delimiter=','
+    ):
+        if len(registrar_row) > 3 and registrar_row[3]:
+            # the first row wins when a name is listed several times
+            registrars.setdefault(
+                registrar_row[1].lower(),
+                registrar_row[3].rstrip('/') + '/'
+            )
+    return registrars
+
 def expiration(domain, server):
     """Find the expiration date for the domain."""
 
@@ -139,34 +436,20 @@ def expiration(domain, server):
         return raw_expiration[0]
     # we have not, so we try to fall back to registrar ldap
     elif isinstance(raw_expiration[0], str):
-        import csv
-        # fetch csv
-        iana_registrars_req = session.get(
-            'https://www.iana.org/assignments/registrar-ids/registrar-ids-1.csv',
-            timeout=120
-        )
-        iana_registrars_csv = iana_registrars_req.content.decode('utf-8')
-        # parse csv
-        registrar_rdap_found = False
-        for registrar_row in csv.reader(
-            iana_registrars_csv.splitlines(),
-            delimiter=','
-        ):
-            # lower case comparaison just in case (haha)
-            if registrar_row[1].lower() == raw_expiration[0].lower():
-                # re-query
-                _log.debug(f'Falling back to registrar RDAP: {registrar_row[3]}')
-                registrar_rdap_found = True
-                registrar_expiration = parse_ldap(domain, registrar_row[3])
-                if isinstance(registrar_expiration[0], int):
-                    return registrar_expiration[0]
-                else:
-                    raise nagiosplugin.CheckError(
-                        f'Neither TLD or {registrar_row[3]} have expiration data'
-                    )
-        if not(registrar_rdap_found):
+        registrar = raw_expiration[0].lower()
+        registrar_url = load_registrar_map().get(registrar)
+        if registrar_url is None:
+            raise nagiosplugin.CheckError(
+                f'The registrar {raw_expiration[0]} is not found from {iana_registrars_url}'
+            )
+        # re-query
+        _log.debug('Falling back to registrar RDAP: %s', registrar_url)
+        registrar_expiration = parse_ldap(domain, registrar_url)
+        if isinstance(registrar_expiration[0], int):
+            return registrar_expiration[0]
+        else:
             raise nagiosplugin.CheckError(
-                f'The registrar {raw_expiration[0]} is not found from {iana_registrars_req.url}'
+                f'Neither TLD or {registrar_url} have expiration data'
             )
 
     else:
@@ -186,23 +469,80 @@ class Expiration(nagiosplugin.Resource):
     not cached because we can not presume of the data lifetime.
     """
 
-    def __init__(self, domain, server):
-        self.domain = domain
+    def __init__(self, domains, server):
+        self.domains = domains
         self.server = server
 
-    def probe(self):
+    def days_to_expiration(self, domain):
         try:
-            days_to_expiration = expiration(self.domain, self.server)
+            return expiration(domain, self.server)
         except requests.exceptions.ConnectionError as err:
             raise nagiosplugin.CheckError(
                 f'The connection to the RDAP server failed: {err}'
             )
+        except requests.exceptions.RetryError as err:
+            raise nagiosplugin.CheckError(
+                f'The RDAP server kept failing after retries: {err}'
+            )
+        except urllib3.exceptions.MaxRetryError as err:
+            if isinstance(err.reason, urllib3.exceptions.ResponseError):
+                raise nagiosplugin.CheckError(
+                    f'The RDAP server kept failing after retries: {err}'
+                )
+            raise nagiosplugin.CheckError(
+                f'The connection to the RDAP server failed: {err}'
+            )
+        except urllib3.exceptions.HTTPError as err:
+            raise nagiosplugin.CheckError(
+                f'The connection to the RDAP server failed: {err}'
+            )
 
-        return [nagiosplugin.Metric(
-            'daystoexpiration',
-            days_to_expiration,
-            uom='d'
-        )]
+    def probe(self):
+        # keep the historic metric name when checking a single domain
+        if len(self.domains) == 1:
+            return [nagiosplugin.Metric(
+                'daystoexpiration',
+                self.days_to_expiration(self.domains[0]),
+                uom='d'
+            )]
+
+        # the domains are queried concurrently over the pooled connections
+        with ThreadPoolExecutor(
+            max_workers=min(max_workers, len(self.domains))
+        ) as ex:
+            futures = [
+                ex.submit(self.days_to_expiration, domain)
+                for domain in self.domains
+            ]
+
+        metrics = []
+        for domain, future in zip(self.domains, futures):
+            # a failing domain must not hide the others
+            try:
+                metrics.append(nagiosplugin.Metric(
+                    domain,
+                    future.result(),
+                    uom='d',
+                    context='daystoexpiration'
+                ))
+            except Exception as err:
+                metrics.append(nagiosplugin.Metric(
+                    domain,
+                    str(err),
+                    context='expirationerror'
+                ))
+        return metrics
+
+
+class ExpirationError(nagiosplugin.Context):
+    """Domain which could not be checked, reported as unknown."""
+
+    def evaluate(self, metric, resource):
+        return self.result_cls(
+            nagiosplugin.Unknown,
+            f'{metric.name}: {metric.value}',
+            metric
+        )
 
 
 # data presentation
@@ -211,25 +551,54 @@ class ExpirationSummary(nagiosplugin.Summary):
     """Status line conveying expiration information.
     """
 
-    def __init__(self, domain):
-        self.domain = domain
+    def __init__(self, domains):
+        self.domains = domains
 
-    pass
+    def ok(self, results):
+        return ', '.join(str(result) for result in results)
+
+    def problem(self, results):
+        return ', '.join(str(result) for result in results.most_significant)
 
 
 # runtime environment and data evaluation
 
+def ascii_domain(domain):
+    """Convert the domain to its punycode form (IDNA 2008, UTS #46 mapping)."""
+    # only pay for the punycode conversion on IDN
+    if not domain.isascii():
+        domain = idna.encode(domain, uts46=True).decode('ascii')
+    return domain
+
+
+def serve(server):
+    """Check the domains read from stdin, one per line, until EOF.
+
+    The caches, the connection pools and the DNS cache are kept across the
+    domains, so that one process can check hundreds of them.
+    """
+    for line in sys.stdin:
+        domain = line.strip()
+        if not domain:
+            continue
+        # a failing domain must not stop the loop
+        try:
+            days_to_expiration = expiration(ascii_domain(domain), server)
+        except Exception as err:
+            print(f'{domain} UNKNOWN {err}', flush=True)
+        else:
+            print(f'{domain} {days_to_expiration}', flush=True)
+
+
 @nagiosplugin.guarded
 def main():
-    import pyunycode
-
     argp = argparse.ArgumentParser(description=__doc__)
     argp.add_argument(
-        '-w', '--warning', metavar='int', default='30', 
+        '-w', '--warning', metavar='int', default=None,
         help='warning expiration max days. Default=30'
     )
     argp.add_argument(
-        '-c', '--critical', metavar='range', default='15',
+        '-c', '--critical', metavar='range', default=None,
         help='critical expiration max days. Default=15'
     )
     argp.add_argument(
@@ -245,11 +614,29 @@ def main():
         '-d', '--debug', action='count', default=0,
         help='debug logging to /tmp/nagios-check_domain_expiration_rdap.log'
     )
-    argp.add_argument('domain')
+    argp.add_argument(
+        '--stdin', action='store_true',
+        help='read the domains from stdin, one per line, and print their days until expiration'
+    )
+    argp.add_argument('domain', nargs='*')
     args = argp.parse_args()
+    if args.stdin and args.domain:
+        argp.error('domain can not be used with --stdin')
+    if not (args.stdin or args.domain):
+        argp.error('the following arguments are required: domain')
+    # --stdin prints the days only, there is no threshold to evaluate
+    if args.stdin and (args.warning is not None or args.critical is not None):
+        argp.error('--warning and --critical can not be used with --stdin')
+    if args.warning is None:
+        args.warning = '30'
+    if args.critical is None:
+        args.critical = '15'
     wrange = f'@{args.critical}:{args.warning}'
     crange = f'@~:{args.critical}'
-    fmetric = '{value} days until domain expires'
+    if len(args.domain) == 1:
+        fmetric = '{value} days until domain expires'
+    else:
+        fmetric = '{name}: {value} days until domain expires'
 
     if (args.debug):
         logging.basicConfig(
@@ -259,20 +646,26 @@ def main():
             level=logging.DEBUG
         )
 
-    domain = pyunycode.convert(args.domain)
     # be sure that the provided server url ends with / for future concat
     if (isinstance(args.server, str) and args.server[-1] != '/'):
         server = args.server + '/'
     else:
         server = args.server
+
+    if args.stdin:
+        serve(server)
+        return
+
+    domains = [ascii_domain(domain) for domain in args.domain]
     check = nagiosplugin.Check(
-        Expiration(domain, server),
+        Expiration(domains, server),
         nagiosplugin.ScalarContext(
             'daystoexpiration',
             warning=wrange,
             critical=crange,
             fmt_metric=fmetric
         ),
+        ExpirationError('expirationerror'),
         ExpirationSummary(args.domain)
     )
     check.main(verbose=args.verbose)